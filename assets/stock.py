@@ -8,10 +8,14 @@ from assets.security import Security
 # Retrieving stock history
 from alpaca.data.historical import StockHistoricalDataClient
 from alpaca.data.requests import StockBarsRequest
-from alpaca.data.timeframe import TimeFrame
+from alpaca.data.timeframe import TimeFrame, TimeFrameUnit
+
+# Exchange sessions for aligning bars
+from assets.trading_calendar import get_calendar
 
 # Plotly for charting
 import plotly.express as px
+from charts.render import downsample, render
 
 # temporary local user config
 homedir          = path.expanduser('~')
@@ -41,6 +45,10 @@ class Stock(Security):
     def __str__(self):
         return f"Stock with ticker {self.ticker} in market {self.mid}"
 
+    def get_calendar(self):
+        '''Returns the precomputed trading calendar of the market the stock is traded in'''
+        return get_calendar(self.mid)
+
     def get_historical_data(self, start_date, end_date, timeframe = TimeFrame.Day):
         """
         Returns historical data for stock by given timeframe intervals on [start,end].
@@ -90,20 +98,29 @@ class Stock(Security):
         data.reset_index(inplace=True)
         data.set_index('timestamp', inplace=True)
         data.index.name = 'date'
-        data = data.ffill()
+
+        # align onto the market's full bar index for the range, so every series over it shares bar positions
+        if timeframe.unit in (TimeFrameUnit.Minute, TimeFrameUnit.Hour, TimeFrameUnit.Day) and not data.empty:
+            calendar = self.get_calendar()
+            data = calendar.align(data, calendar.get_bars(start_date, end_date, timeframe), exact=True)
+
+        # fill missing bars between data points, bars before or after the data stay empty
+        data = data.ffill(limit_area='inside')
 
         # calculate daily and cumulative returns on stock
-        data[f'daily_return'] = data['close'].pct_change()
+        data[f'daily_return'] = data['close'].pct_change(fill_method=None)
         data[f'total_return'] = data[f'daily_return'].add(1).cumprod().sub(1)
 
         return data
 
     def plot_historical_data(self, historical_data) -> None:
         '''Generates a plot of daily closing value from historical data'''
-        fig = px.line(historical_data, x = historical_data.index, y = ['close'])
-        fig.show()
+        data = downsample(historical_data, ['close'])
+        fig = px.line(data, x = data.index, y = ['close'])
+        render(fig, f"{self.ticker} historical data")
 
     def plot_performance_data(self, performance_data) -> None:
         '''Generates a plot of daily and total return from performance data'''
-        fig = px.line(performance_data, x = performance_data.index, y = ['daily_return','total_return'])
-        fig.show()
\ No newline at end of file
+        data = downsample(performance_data, ['daily_return','total_return'])
+        fig = px.line(data, x = data.index, y = ['daily_return','total_return'])
+        render(fig, f"{self.ticker} performance data")
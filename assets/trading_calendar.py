@@ -0,0 +1,229 @@
+# Pandas holiday rules for building exchange sessions
+import pandas as pd
+import numpy as np
+from pandas.tseries.holiday import AbstractHolidayCalendar, Holiday, GoodFriday, USPresidentsDay, \
+    USMemorialDay, USLaborDay, USThanksgivingDay, nearest_workday, sunday_to_monday
+from pandas.tseries.offsets import CustomBusinessDay, DateOffset
+from dateutil.relativedelta import MO
+
+# Alpaca
+from alpaca.data.timeframe import TimeFrame, TimeFrameUnit
+
+class NYSEHolidayCalendar(AbstractHolidayCalendar):
+    '''Full day holidays observed by NYSE and Nasdaq'''
+    rules = [
+         Holiday('New Years Day', month=1, day=1, observance=sunday_to_monday)
+        ,Holiday('Martin Luther King Jr. Day', start_date='1998-01-01', month=1, day=1, offset=DateOffset(weekday=MO(3)))
+        ,USPresidentsDay
+        ,GoodFriday
+        ,USMemorialDay
+        ,Holiday('Juneteenth', start_date='2022-01-01', month=6, day=19, observance=nearest_workday)
+        ,Holiday('Independence Day', month=7, day=4, observance=nearest_workday)
+        ,USLaborDay
+        ,USThanksgivingDay
+        ,Holiday('Christmas', month=12, day=25, observance=nearest_workday)
+    ]
+
+# unscheduled full day closures (weather, national days of mourning, etc.)
+SPECIAL_CLOSURES = [
+     '2001-09-11', '2001-09-12', '2001-09-13', '2001-09-14'
+    ,'2004-06-11'
+    ,'2007-01-02'
+    ,'2012-10-29', '2012-10-30'
+    ,'2018-12-05'
+    ,'2025-01-09'
+]
+
+# exchange timezone and regular session hours by Market Identifier Code
+EXCHANGES = {
+     'XNYS': {'tz': 'America/New_York', 'open': '09:30', 'close': '16:00'}
+    ,'XNAS': {'tz': 'America/New_York', 'open': '09:30', 'close': '16:00'}
+}
+
+# NYSE-family venues which trade the same sessions as NYSE
+MIC_ALIASES = {
+     'ARCX': 'XNYS'  # NYSE Arca
+    ,'XASE': 'XNYS'  # NYSE American
+    ,'BATS': 'XNYS'  # Cboe BZX
+}
+
+# precomputed calendars by Market Identifier Code
+calendars = {}
+
+def get_calendar(mid: str = 'XNYS'):
+    '''Returns the precomputed TradingCalendar for a Market Identifier Code'''
+    mid = MIC_ALIASES.get(mid, mid)
+    if mid not in calendars:
+        calendars[mid] = TradingCalendar(mid)
+    return calendars[mid]
+
+class TradingCalendar:
+    '''
+    The TradingCalendar object maps timestamps onto the integer bar positions of an exchange's regular sessions.
+
+    Sessions are precomputed once per exchange, so aligning several series onto the same bar index turns later joins
+    and window operations into integer-offset array work instead of repeated datetime merges. Early closes are
+    treated as full sessions.
+
+    Args:
+         mid(str): Market Identifier Code, default is XNYS (NYSE)
+        ,start(str): YYYY-MM-DD string of the first precomputed session
+        ,end(str): YYYY-MM-DD string of the last precomputed session
+
+    Attributes:
+         mid(str): Market Identifier Code of the exchange
+        ,tz(str): Timezone the exchange trades in
+        ,sessions(DatetimeIndex): Dates the exchange is open on
+    '''
+    def __init__(self, mid: str = 'XNYS', start: str = '2000-01-01', end: str = '2035-12-31') -> None:
+        if mid not in EXCHANGES:
+            raise ValueError(f"No trading calendar for market {mid}, expected one of {list(EXCHANGES)}")
+
+        self.mid = mid
+        self.tz = EXCHANGES[mid]['tz']
+        self.open = pd.Timedelta(f"{EXCHANGES[mid]['open']}:00")
+        self.close = pd.Timedelta(f"{EXCHANGES[mid]['close']}:00")
+
+        holidays = NYSEHolidayCalendar().holidays(start, end).union(pd.DatetimeIndex(SPECIAL_CLOSURES))
+        self.sessions = pd.date_range(start, end, freq=CustomBusinessDay(holidays=holidays))
+
+        # bar indexes already built, by (start, end, amount, unit)
+        self._bars = {}
+
+    def __str__(self):
+        return f"Trading calendar for market {self.mid}"
+
+    def get_sessions(self, start_date, end_date):
+        '''
+        Returns the session dates on [start,end].
+
+        params:
+            start_date (str): YYYY-MM-DD string when sessions start
+            end_date (str): YYYY-MM-DD string when sessions end
+
+        returns:
+            DatetimeIndex: session dates
+        '''
+        low  = self.sessions.searchsorted(self._to_date(start_date), side='left')
+        high = self.sessions.searchsorted(self._to_date(end_date), side='right')
+        return self.sessions[low:high]
+
+    def trading_days(self, start_date, end_date) -> int:
+        '''Returns the number of sessions on [start,end]'''
+        return len(self.get_sessions(start_date, end_date))
+
+    def get_bars(self, start_date, end_date, timeframe = TimeFrame.Day):
+        '''
+        Returns the UTC timestamps of every bar by given timeframe intervals on [start,end].
+        The index is cached per range, so every series aligned onto it shares the same bar positions.
+        Daily bars are stamped at midnight exchange time and intraday bars on the clock boundary they open at,
+        e.g. 09:00 for the hourly bar covering the open, matching Alpaca.
+
+        params:
+            start_date (str): YYYY-MM-DD string when bars start
+            end_date (str): YYYY-MM-DD string when bars end
+            timeframe (TimeFrame): interval for each bar, default is a day
+
+        returns:
+            DatetimeIndex: bar timestamps, the bar position is the integer location in this index
+        '''
+        key = (str(start_date), str(end_date), timeframe.amount, timeframe.unit)
+        if key in self._bars:
+            return self._bars[key]
+
+        sessions = self.get_sessions(start_date, end_date)
+
+        if timeframe.unit == TimeFrameUnit.Day:
+            bars = sessions[::timeframe.amount].tz_localize(self.tz)
+        else:
+            # offsets of each bar open from midnight, repeated for every session
+            offsets = self._get_bar_offsets(timeframe)
+            opens = np.repeat(sessions.values, len(offsets)) + np.tile(offsets.values, len(sessions))
+            bars = pd.DatetimeIndex(opens).tz_localize(self.tz)
+
+        bars = bars.tz_convert('UTC')
+        self._bars[key] = bars
+        return bars
+
+    def bars_per_year(self, timeframe = TimeFrame.Day) -> float:
+        '''
+        Returns the average number of bars in a year by given timeframe intervals, e.g. about 252 for daily bars.
+
+        params:
+            timeframe (TimeFrame): interval for each bar, default is a day
+
+        returns:
+            float: bars per year, for annualizing per-bar statistics
+        '''
+        years = (self.sessions[-1] - self.sessions[0]).days / 365.25
+        sessions_per_year = len(self.sessions) / years
+
+        if timeframe.unit == TimeFrameUnit.Day:
+            return sessions_per_year / timeframe.amount
+        return sessions_per_year * len(self._get_bar_offsets(timeframe))
+
+    def get_positions(self, timestamps, bars, exact = False):
+        '''
+        Returns the integer position of the bar each timestamp falls in, or -1 when there is none.
+        Positions are offsets into bars, so only compare positions taken against the same bar index.
+
+        params:
+            timestamps (DatetimeIndex): timestamps to map, naive timestamps are treated as UTC
+            bars (DatetimeIndex): bar index from get_bars()
+            exact (bool): only match timestamps equal to a bar's timestamp, e.g. price bars outside regular hours map to -1
+
+        returns:
+            numpy array: bar positions
+        '''
+        timestamps = pd.DatetimeIndex(timestamps)
+        if timestamps.tz is None:
+            timestamps = timestamps.tz_localize('UTC')
+        timestamps = timestamps.tz_convert('UTC')
+
+        if exact:
+            return bars.get_indexer(timestamps)
+
+        # otherwise the last bar opening at or before each timestamp
+        return bars.searchsorted(timestamps, side='right') - 1
+
+    def align(self, data, bars, how = 'last', exact = False):
+        '''
+        Aligns a timestamp indexed dataframe onto a bar index, aggregating rows that fall in the same bar.
+
+        params:
+            data (df): timestamp indexed dataframe
+            bars (DatetimeIndex): bar index from get_bars()
+            how (str): aggregation for rows within one bar, e.g. last, sum, mean
+            exact (bool): only keep rows stamped exactly at a bar, see get_positions()
+
+        returns:
+            pandas dataframe: one row per bar in bars, missing bars are NaN
+        '''
+        positions = self.get_positions(data.index, bars, exact)
+
+        # rows without a bar have nowhere to go
+        in_range = positions >= 0
+
+        aligned = data[in_range].groupby(positions[in_range]).agg(how).reindex(range(len(bars)))
+        aligned.index = bars
+        aligned.index.name = data.index.name
+        return aligned
+
+    def _get_bar_offsets(self, timeframe):
+        '''Returns the offsets from midnight of the intraday bars overlapping a regular session'''
+        if timeframe.unit == TimeFrameUnit.Minute:
+            step = pd.Timedelta(minutes=timeframe.amount)
+        elif timeframe.unit == TimeFrameUnit.Hour:
+            step = pd.Timedelta(hours=timeframe.amount)
+        else:
+            raise ValueError(f"Bars are only built for minute, hour and day timeframes, got {timeframe}")
+
+        # bars open on clock boundaries, so the first one may open before the session does
+        return pd.timedelta_range(self.open.floor(step), self.close - pd.Timedelta(1), freq=step)
+
+    def _to_date(self, timestamp):
+        '''Returns the exchange-local date of a date string or timestamp'''
+        timestamp = pd.Timestamp(timestamp)
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.tz_convert(self.tz).tz_localize(None)
+        return timestamp.normalize()
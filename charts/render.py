@@ -0,0 +1,136 @@
+# Filesystem and browser
+import re
+import webbrowser
+from os import path, makedirs
+
+# Background rendering
+from concurrent.futures import ThreadPoolExecutor
+
+# Numpy/Pandas
+import numpy as np
+import pandas as pd
+
+# default number of points kept per plotted series
+MAX_POINTS = 2000
+
+# default location charts are written to
+homedir    = path.expanduser('~')
+charts_dir = path.join(homedir, 'data/charts')
+
+# single worker, so charts are written in the order they were requested
+executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='charts')
+
+def lttb(x, y, n_points = MAX_POINTS):
+    '''
+    Returns the positions of n_points that preserve the visual shape of y over x, using Largest-Triangle-Three-Buckets.
+
+    params:
+        x (array): numeric x values, sorted ascending
+        y (array): numeric y values, without NaNs
+        n_points (int): number of points to keep, including the first and last
+
+    returns:
+        numpy array: sorted integer positions of the kept points
+    '''
+    length = len(y)
+    if n_points >= length or n_points < 3:
+        return np.arange(length)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # the first and last points are always kept, the rest are split into n_points - 2 buckets
+    edges = np.linspace(1, length - 1, n_points - 1).astype(int)
+
+    selected = np.empty(n_points, dtype=int)
+    selected[0], selected[-1] = 0, length - 1
+
+    previous = 0
+    for bucket in range(n_points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+
+        # third corner of the triangle is the average of the next bucket, or the last point
+        if bucket < n_points - 3:
+            next_end = edges[bucket + 2]
+            average_x, average_y = x[end:next_end].mean(), y[end:next_end].mean()
+        else:
+            average_x, average_y = x[-1], y[-1]
+
+        # keep the point in this bucket forming the largest triangle with the previously kept point
+        areas = np.abs((x[previous] - average_x) * (y[start:end] - y[previous])
+                     - (x[previous] - x[start:end]) * (average_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+
+    return selected
+
+def downsample(data, columns = None, n_points = MAX_POINTS, keep = None):
+    '''
+    Returns the rows of data needed to draw each column with at most n_points, always keeping the rows in keep.
+
+    params:
+        data (df): dataframe to plot, indexed by timestamp or number
+        columns (list): columns that will be plotted, default is every column
+        n_points (int): number of points kept per column
+        keep (Index): index labels which are always kept, e.g. buy/sell orders
+
+    returns:
+        pandas dataframe: subset of the rows of data in their original order
+    '''
+    columns = list(data.columns) if columns is None else columns
+    if len(data) <= n_points:
+        return data
+
+    if isinstance(data.index, pd.DatetimeIndex):
+        x = data.index.asi8
+    elif pd.api.types.is_numeric_dtype(data.index):
+        x = data.index.to_numpy()
+    else:
+        x = np.arange(len(data))
+
+    positions = []
+    for column in columns:
+        # downsample the non-null points, then map back to row positions
+        present = np.flatnonzero(data[column].notna().to_numpy())
+        y = data[column].to_numpy()[present]
+        positions.append(present[lttb(x[present], y, n_points)])
+
+    if keep is not None and len(keep):
+        kept = data.index.get_indexer(keep)
+        positions.append(kept[kept >= 0])
+
+    return data.iloc[np.unique(np.concatenate(positions))]
+
+def render(fig, name, directory = charts_dir, open_browser = True):
+    '''
+    Writes a figure to an html file on a background thread, so plotting doesn't block the caller.
+
+    params:
+        fig (Figure): plotly figure to write
+        name (str): name of the chart, used for the file name
+        directory (str): directory to write the chart to, default is ~/data/charts
+        open_browser (bool): Whether or not to open the chart once it is written
+
+    returns:
+        Future: resolves to the path of the written chart
+    '''
+    file_name = re.sub(r'[^A-Za-z0-9_.-]+', '_', name).strip('_') + '.html'
+    file_path = path.join(directory, file_name)
+
+    def write():
+        makedirs(directory, exist_ok=True)
+
+        # load plotly.js from its CDN instead of embedding it in every chart
+        fig.write_html(file_path, include_plotlyjs='cdn')
+        if open_browser:
+            webbrowser.open(f'file://{path.abspath(file_path)}')
+        return file_path
+
+    def report(future):
+        # nobody waits on the future, so surface failures here
+        if future.exception() is not None:
+            print(future.exception())
+
+    future = executor.submit(write)
+    future.add_done_callback(report)
+    return future
@@ -3,6 +3,11 @@ from os import path
 import json
 import pandas as pd
 import asyncio
+import sys
+
+# local message store, with the repo root on the path so the example also runs as a script
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+from storage.message_store import MessageStore
 
 # temporary local user config
 homedir          = path.expanduser('~')
@@ -32,6 +37,7 @@ async def scrape_user(handle):
     tweets_to_store = []
     for tweet in tweets:
         tweets_to_store.append({
+            'id': tweet.id,
             'created_at': tweet.created_at,
             'favorite_count': tweet.favorite_count,
             'full_text': tweet.full_text,
@@ -41,6 +47,10 @@ async def scrape_user(handle):
     df = pd.DataFrame(tweets_to_store)
     df.to_csv(path.join(homedir,f'data/{handle}_tweets.csv'), index=False)
 
+    # Or append them to the local message store, which can be range queried by time and ticker
+    store = MessageStore()
+    store.append('twitter', handle, df.rename(columns={'created_at': 'timestamp', 'full_text': 'text'}))
+
     # Pandas also allows us to sort or filter the data
     print(df.sort_values(by='favorite_count', ascending=False))
 
@@ -0,0 +1,398 @@
+# Filesystem and (de)serialization
+import os
+import re
+import json
+import mmap
+from os import path
+from hashlib import blake2b
+from heapq import merge
+
+# Numpy for the memory-mapped segment indexes
+import numpy as np
+
+# Pandas
+import pandas as pd
+
+# default location of the local store
+homedir = path.expanduser('~')
+
+# fixed-width index row written for every message in a segment
+INDEX_DTYPE = np.dtype([
+     ('timestamp', '<i8')  # UTC nanoseconds since epoch
+    ,('id'       , '<u8')  # 64-bit hash of the message id
+    ,('offset'   , '<i8')  # byte offset of the record in the segment file
+    ,('length'   , '<u4')  # byte length of the record
+])
+
+# (ticker, row) pair written for every ticker a message mentions, in row order
+TICKER_INDEX_DTYPE = np.dtype([
+     ('ticker', 'S8')   # upper case ticker, longer tickers are truncated
+    ,('row'   , '<u4')  # row of the message in the segment's index
+])
+
+# $AAPL, $BRK.B style cashtags
+CASHTAG = re.compile(r'\$([A-Za-z]{1,5}(?:\.[A-Za-z])?)\b')
+
+class MessageStore:
+    '''
+    The MessageStore object persists scraped messages in append-only, time-ordered segment files per source/channel.
+
+    Each channel directory holds numbered segments: a `.seg` file of newline delimited JSON records and an `.idx` file
+    of fixed-width (timestamp, id hash, offset, length) rows sorted by timestamp, plus a `.tix` file of (ticker, row)
+    pairs. A `manifest.json` records the committed size, time range and tickers of every segment so range and ticker
+    queries can skip whole segments, and reads only memory-map the parts of the files they need. The store assumes a
+    single writer per channel.
+
+    Args:
+         root(str): Directory the store is kept in, default is ~/data/messages
+        ,segment_size(int): Maximum number of messages written to a single segment
+
+    Attributes:
+         root(str): Directory the store is kept in
+        ,segment_size(int): Maximum number of messages written to a single segment
+    '''
+    def __init__(self, root: str = path.join(homedir, 'data/messages'), segment_size: int = 50000) -> None:
+        self.root = root
+        self.segment_size = segment_size
+
+    def __str__(self):
+        return f"MessageStore at {self.root}"
+
+    def append(self, source, channel, messages) -> int:
+        '''
+        Appends messages to the channel, starting a new segment whenever the current one is full
+        or the messages are older than its last timestamp, so every segment stays time-ordered.
+        The first stored copy of a message wins: ids already in the store are skipped, so re-scraping
+        the same messages is safe but doesn't update fields such as like counts.
+
+        params:
+            source (str): where the messages were scraped from, e.g. discord or twitter
+            channel (str): channel id or user handle within the source
+            messages (list or df): messages with at least `id` and `timestamp`, `text` and `tickers` are optional
+
+        returns:
+            int: number of messages appended
+        '''
+        if isinstance(messages, pd.DataFrame):
+            messages = messages.to_dict('records')
+
+        records = sorted((self._normalize(message) for message in messages), key=lambda record: record[0])
+        if not records:
+            return 0
+
+        channel_dir = self._channel_dir(source, channel)
+        os.makedirs(channel_dir, exist_ok=True)
+        manifest = self._load_manifest(channel_dir)
+
+        # drop anything past the last committed write, e.g. from an interrupted append
+        if manifest['segments']:
+            self._truncate(channel_dir, manifest['segments'][-1])
+
+        # skip ids already stored, a re-scraped message keeps its timestamp so only overlapping segments are checked
+        stored = set()
+        for segment in manifest['segments']:
+            if segment['end'] >= records[0][0] and segment['start'] <= records[-1][0]:
+                stored.update(self._load_index(channel_dir, segment)['id'].tolist())
+
+        unique = []
+        for record in records:
+            if record[1] not in stored:
+                stored.add(record[1])
+                unique.append(record)
+
+        records = unique
+        if not records:
+            return 0
+
+        position = 0
+        while position < len(records):
+            segment = manifest['segments'][-1] if manifest['segments'] else None
+            if segment is None or segment['count'] >= self.segment_size or records[position][0] < segment['end']:
+                segment = self._new_segment(manifest)
+
+            batch = records[position:position + self.segment_size - segment['count']]
+            self._write(channel_dir, segment, batch)
+            position += len(batch)
+
+        self._save_manifest(channel_dir, manifest)
+        return len(records)
+
+    def scan(self, source, channel = None, start = None, end = None, ticker = None):
+        '''
+        Yields messages in timestamp order on [start,end], without loading whole segments into memory.
+
+        params:
+            source (str): where the messages were scraped from
+            channel (str): channel to scan, default is every channel of the source
+            start (str or datetime): earliest timestamp, default is unbounded
+            end (str or datetime): latest timestamp, default is unbounded
+            ticker (str): only yield messages mentioning this ticker
+
+        returns:
+            generator: message dicts ordered by timestamp
+        '''
+        start = np.iinfo(np.int64).min if start is None else self._to_ns(start)
+        end   = np.iinfo(np.int64).max if end   is None else self._to_ns(end)
+        ticker = ticker.upper() if ticker else None
+
+        channels = [channel] if channel is not None else self.channels(source)
+
+        # segments may overlap in time, so merge their sorted streams
+        streams = []
+        for name in channels:
+            channel_dir = self._channel_dir(source, name)
+            for segment in self._load_manifest(channel_dir)['segments']:
+                if segment['end'] < start or segment['start'] > end:
+                    continue
+                if ticker and ticker not in segment['tickers']:
+                    continue
+                streams.append(self._scan_segment(channel_dir, segment, start, end, ticker))
+
+        for _, message in merge(*streams, key=lambda item: item[0]):
+            yield message
+
+    def read(self, source, channel = None, start = None, end = None, ticker = None):
+        '''
+        Returns df of messages on [start,end], indexed by timestamp.
+
+        params:
+            source (str): where the messages were scraped from
+            channel (str): channel to read, default is every channel of the source
+            start (str or datetime): earliest timestamp, default is unbounded
+            end (str or datetime): latest timestamp, default is unbounded
+            ticker (str): only return messages mentioning this ticker
+
+        returns:
+            pandas dataframe: messages ordered by timestamp
+        '''
+        data = pd.DataFrame(list(self.scan(source, channel, start, end, ticker)))
+        if data.empty:
+            return data
+
+        data['timestamp'] = pd.to_datetime(data['timestamp'], utc=True)
+        data.set_index('timestamp', inplace=True)
+        return data
+
+    def get(self, source, channel, message_id):
+        '''
+        Returns a single message by id, or None if it is not in the store.
+
+        params:
+            source (str): where the message was scraped from
+            channel (str): channel the message was posted in
+            message_id (str or int): id of the message
+
+        returns:
+            dict: the stored message
+        '''
+        id_hash = self._hash_id(message_id)
+        channel_dir = self._channel_dir(source, channel)
+
+        for segment in self._load_manifest(channel_dir)['segments']:
+            index = self._load_index(channel_dir, segment)
+            for row in np.flatnonzero(index['id'] == id_hash):
+                message = self._read_record(channel_dir, segment, index[row])
+                if str(message['id']) == str(message_id):
+                    return message
+
+        return None
+
+    def compact(self, source, channel, min_size = None) -> int:
+        '''
+        Rewrites segments smaller than min_size into full, time-ordered segments, dropping duplicate message ids.
+
+        params:
+            source (str): where the messages were scraped from
+            channel (str): channel to compact
+            min_size (int): segments with fewer messages are compacted, default is a quarter of segment_size
+
+        returns:
+            int: number of segments removed
+        '''
+        min_size = self.segment_size // 4 if min_size is None else min_size
+        channel_dir = self._channel_dir(source, channel)
+        manifest = self._load_manifest(channel_dir)
+
+        small = [segment for segment in manifest['segments'] if segment['count'] < min_size]
+        if len(small) < 2:
+            return 0
+
+        # read every message of the small segments, keeping the first copy of each id like append does
+        messages = {}
+        for order, segment in enumerate(small):
+            index = self._load_index(channel_dir, segment)
+            for row in index:
+                message = self._read_record(channel_dir, segment, row)
+                messages.setdefault(str(message['id']), (int(row['timestamp']), order, message))
+
+        records = [self._normalize(message) for _, _, message in sorted(messages.values(), key=lambda item: item[:2])]
+
+        # write the replacements before touching the manifest, so a crash leaves the store readable
+        kept = [segment for segment in manifest['segments'] if segment['count'] >= min_size]
+        compacted = []
+        for position in range(0, len(records), self.segment_size):
+            segment = self._new_segment(manifest)
+            self._write(channel_dir, segment, records[position:position + self.segment_size])
+            compacted.append(segment)
+
+        manifest['segments'] = kept + compacted
+        self._save_manifest(channel_dir, manifest)
+
+        for segment in small:
+            for extension in ('seg', 'idx', 'tix'):
+                os.remove(path.join(channel_dir, f"{segment['name']}.{extension}"))
+
+        return len(small) - len(compacted)
+
+    def channels(self, source):
+        '''Returns the channels stored for a source'''
+        source_dir = path.join(self.root, str(source))
+        if not path.isdir(source_dir):
+            return []
+        return sorted(name for name in os.listdir(source_dir) if path.isfile(path.join(source_dir, name, 'manifest.json')))
+
+    def _channel_dir(self, source, channel):
+        return path.join(self.root, str(source), str(channel))
+
+    def _load_manifest(self, channel_dir):
+        manifest_path = path.join(channel_dir, 'manifest.json')
+        if not path.isfile(manifest_path):
+            return {'next_segment': 0, 'segments': []}
+
+        with open(manifest_path, 'r') as file:
+            manifest = json.load(file)
+
+        for segment in manifest['segments']:
+            segment['tickers'] = set(segment['tickers'])
+        return manifest
+
+    def _save_manifest(self, channel_dir, manifest):
+        '''Atomically replaces the manifest, which commits any data written since the last save'''
+        data = dict(manifest, segments=[dict(segment, tickers=sorted(segment['tickers'])) for segment in manifest['segments']])
+
+        temp_path = path.join(channel_dir, 'manifest.json.tmp')
+        with open(temp_path, 'w') as file:
+            json.dump(data, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path.join(channel_dir, 'manifest.json'))
+
+    def _new_segment(self, manifest):
+        segment = {
+             'name': f"{manifest['next_segment']:08d}"
+            ,'count': 0
+            ,'bytes': 0
+            ,'start': None
+            ,'end': None
+            ,'ticker_rows': 0
+            ,'tickers': set()
+        }
+        manifest['next_segment'] += 1
+        manifest['segments'].append(segment)
+        return segment
+
+    def _truncate(self, channel_dir, segment):
+        sizes = (
+             ('seg', segment['bytes'])
+            ,('idx', segment['count'] * INDEX_DTYPE.itemsize)
+            ,('tix', segment['ticker_rows'] * TICKER_INDEX_DTYPE.itemsize)
+        )
+        for extension, size in sizes:
+            file_path = path.join(channel_dir, f"{segment['name']}.{extension}")
+            if path.isfile(file_path) and path.getsize(file_path) > size:
+                os.truncate(file_path, size)
+
+    def _write(self, channel_dir, segment, records):
+        '''Appends sorted (timestamp, id hash, tickers, encoded message) records to a segment'''
+        index = np.zeros(len(records), dtype=INDEX_DTYPE)
+        ticker_index = []
+        offset = segment['bytes']
+
+        # a fresh segment may reuse the name of one left behind by an interrupted write, so start it empty
+        mode = 'wb' if segment['count'] == 0 else 'ab'
+
+        with open(path.join(channel_dir, f"{segment['name']}.seg"), mode) as file:
+            for row, (timestamp, id_hash, tickers, encoded) in enumerate(records):
+                file.write(encoded)
+                index[row] = (timestamp, id_hash, offset, len(encoded))
+                offset += len(encoded)
+                segment['tickers'].update(tickers)
+                ticker_index.extend((ticker.encode('utf-8'), segment['count'] + row) for ticker in tickers)
+
+        with open(path.join(channel_dir, f"{segment['name']}.idx"), mode) as file:
+            file.write(index.tobytes())
+
+        with open(path.join(channel_dir, f"{segment['name']}.tix"), mode) as file:
+            file.write(np.array(ticker_index, dtype=TICKER_INDEX_DTYPE).tobytes())
+
+        if segment['start'] is None:
+            segment['start'] = records[0][0]
+        segment['end'] = records[-1][0]
+        segment['count'] += len(records)
+        segment['bytes'] = offset
+        segment['ticker_rows'] += len(ticker_index)
+
+    def _load_index(self, channel_dir, segment):
+        return np.memmap(path.join(channel_dir, f"{segment['name']}.idx"), dtype=INDEX_DTYPE, mode='r', shape=(segment['count'],))
+
+    def _read_record(self, channel_dir, segment, row):
+        with open(path.join(channel_dir, f"{segment['name']}.seg"), 'rb') as file:
+            file.seek(int(row['offset']))
+            return json.loads(file.read(int(row['length'])))
+
+    def _scan_segment(self, channel_dir, segment, start, end, ticker):
+        '''Yields (timestamp, message) on [start,end] from a memory-mapped segment'''
+        index = self._load_index(channel_dir, segment)
+        low  = np.searchsorted(index['timestamp'], start, side='left')
+        high = np.searchsorted(index['timestamp'], end, side='right')
+
+        if ticker:
+            # rows mentioning the ticker, from the ticker index instead of decoding every message in range
+            ticker_index = np.memmap(path.join(channel_dir, f"{segment['name']}.tix"), dtype=TICKER_INDEX_DTYPE,
+                                     mode='r', shape=(segment['ticker_rows'],))
+            matches = ticker_index['row'][ticker_index['ticker'] == ticker.encode('utf-8')[:8]]
+            rows = np.array(index[matches[(matches >= low) & (matches < high)]])
+            del ticker_index
+        else:
+            rows = np.array(index[low:high])
+        del index
+
+        if not len(rows):
+            return
+
+        with open(path.join(channel_dir, f"{segment['name']}.seg"), 'rb') as file, \
+                mmap.mmap(file.fileno(), segment['bytes'], access=mmap.ACCESS_READ) as data:
+            for timestamp, _, offset, length in rows:
+                message = json.loads(data[offset:offset + length])
+
+                # only differs from the index for tickers truncated to 8 bytes
+                if ticker and ticker not in message['tickers']:
+                    continue
+                yield int(timestamp), message
+
+    def _normalize(self, message):
+        '''Returns (timestamp, id hash, tickers, encoded message) for a raw message'''
+        if message.get('id') is None or message.get('timestamp') is None:
+            raise ValueError(f"Messages require an id and timestamp, got {message}")
+
+        timestamp = self._to_ns(message['timestamp'])
+
+        tickers = message.get('tickers')
+        if tickers is None:
+            tickers = CASHTAG.findall(message.get('text') or '')
+        tickers = sorted({str(ticker).upper() for ticker in tickers})
+
+        record = dict(message, timestamp=pd.Timestamp(timestamp, tz='UTC').isoformat(), tickers=tickers)
+        encoded = (json.dumps(record, default=str, separators=(',', ':')) + '\n').encode('utf-8')
+        return timestamp, self._hash_id(message['id']), tickers, encoded
+
+    @staticmethod
+    def _to_ns(timestamp):
+        timestamp = pd.Timestamp(timestamp)
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.tz_localize('UTC')
+        return timestamp.tz_convert('UTC').value
+
+    @staticmethod
+    def _hash_id(message_id):
+        return int.from_bytes(blake2b(str(message_id).encode('utf-8'), digest_size=8).digest(), 'little')
@@ -8,9 +8,11 @@ from alpaca.data.timeframe import TimeFrame
 # Plotly for charting
 import plotly.graph_objects as go
 import plotly.express as px
+from charts.render import downsample, render
 
 # Pandas
 import pandas as pd
+import numpy as np
 
 class SMA_crossover(Strategy):
     '''
@@ -72,10 +74,8 @@ class SMA_crossover(Strategy):
 
         if plot:
 
-            # get both the closing value by interval and strategy
-            plot_data = data.join(strategy['order'])
-
-            print(plot_data)
+            # get both the closing value by interval and strategy, downsampled but keeping every order
+            plot_data = downsample(data.join(strategy['order']), ['close'], keep = strategy.index)
 
             # Plot slow sma, fast sma and price
             fig = px.line(x = plot_data.index, y = plot_data['close'], title = str(self))
@@ -87,7 +87,7 @@ class SMA_crossover(Strategy):
             fig.add_trace(px.scatter(crossunder, x=crossunder.index, y='fast_SMA', color_discrete_sequence=['red'], symbol_sequence=[50]).data[0])
 
             fig.update_traces(marker={'size': 13})
-            fig.show()
+            render(fig, str(self))
 
         return strategy
 
@@ -109,8 +109,15 @@ class SMA_crossover(Strategy):
         performance_df = self.stock.get_performance_data(start, end, timeframe)
         strategy_df    = self.get_strategy(start, end, timeframe, slow_period, fast_period, plot)
 
-        # new dataframe with market data and strategy merged
-        portfolio = pd.merge(performance_df, strategy_df, how='outer', left_index=True, right_index=True)
+        # both frames are on the stock's bar index, so place orders by bar position instead of merging on timestamps
+        portfolio = performance_df.copy()
+        orders = np.full(len(portfolio), np.nan, dtype=object)
+        positions = self.stock.get_calendar().get_positions(strategy_df.index, portfolio.index, exact=True)
+
+        # orders without a bar would otherwise land on the last bar through index -1
+        matched = positions >= 0
+        orders[positions[matched]] = strategy_df['order'].to_numpy()[matched]
+        portfolio['order'] = orders
 
         # "backtest" of our buy and hold strategies
         portfolio['buy_&_hold'] = (portfolio['total_return'] + 1) * equity
@@ -119,38 +126,29 @@ class SMA_crossover(Strategy):
         portfolio[['buy_&_hold']] = portfolio[['buy_&_hold']].ffill()
 
         ### Begin backtest
-        active_position = False
+        # a position is held from each buy until the next sell
+        # built as floats, ffill/fillna on an object column would downcast
+        position_changes = np.select([portfolio['order'] == 'buy', portfolio['order'] == 'sell'], [1.0, 0.0], np.nan)
+        active_position = pd.Series(position_changes, index=portfolio.index).ffill().fillna(0).astype(bool)
 
-        # Iterate row by row of our historical data
-        for index, row in portfolio.iterrows():
-            
-            # change state of position
-            if   row['order'] == 'buy':
-                active_position = True
-            elif row['order'] == 'sell':
-                active_position = False
-            
-            # update strategy equity
-            if active_position:
-                portfolio.loc[index, 'strategy'] = (row['daily_return'] + 1) * equity
-                equity = portfolio.loc[index, f'strategy']
-            else:
-                portfolio.loc[index, 'strategy'] = equity
+        # strategy equity compounds the daily return while in a position
+        growth = np.where(active_position, portfolio['daily_return'].fillna(0) + 1, 1)
+        portfolio['strategy'] = equity * np.cumprod(growth)
 
         if plot:
-            fig = px.line(portfolio[['strategy', 'buy_&_hold']], title = f"Backtest of {str(self)}")
-            fig.show()
+            plot_data = downsample(portfolio[['strategy', 'buy_&_hold']], keep = portfolio.index[portfolio['order'].notna()])
+            fig = px.line(plot_data, title = f"Backtest of {str(self)}")
+            render(fig, f"Backtest of {str(self)}")
 
         return portfolio
     
-    def calc_sharpe_ratio(backtest_portfolio, start_date, end_date):
+    def calc_sharpe_ratio(self, backtest_portfolio, timeframe = TimeFrame.Day):
         """
         Calculates the annualized Sharpe ratio for a given backtest portfolio
 
         params:
             backtest_portfolio (df): portfolio returned from get_backtest()
-            start_date (str): YYYY-MM-DD string when data starts
-            end_date (str): YYYY-MM-DD string when data end
+            timeframe (TimeFrame): interval for each point the backtest was run on
         
         returns:
             numeric: annualized Sharpe ratio
@@ -164,12 +162,10 @@ class SMA_crossover(Strategy):
         std_daily_return         = backtest_portfolio['stategy_daily_returns'].std()
         ticker_mean_daily_return = backtest_portfolio[f'buy_&_hold_daily_returns'].mean()
 
-        # calculate number of trading days
-        start = datetime.strptime(start_date, "%Y-%m-%d").date()
-        end   = datetime.strptime(end_date  , "%Y-%m-%d").date()
-        trading_days = (end - start).days
+        # calculate number of bars in a trading year
+        bars_per_year = self.stock.get_calendar().bars_per_year(timeframe)
 
         daily_sharpe_ratio = (mean_daily_return - ticker_mean_daily_return) / std_daily_return
 
         # annualized sharpe ratio
-        return daily_sharpe_ratio * (trading_days ** 0.5)
\ No newline at end of file
+        return daily_sharpe_ratio * (bars_per_year ** 0.5)
\ No newline at end of file